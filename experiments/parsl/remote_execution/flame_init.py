@@ -34,6 +34,7 @@ from functools import partial
 
 from pytools.obj_array import obj_array_vectorize
 import pickle
+import h5py
 
 from meshmode.array_context import PyOpenCLArrayContext
 from meshmode.dof_array import thaw, flatten, unflatten
@@ -55,9 +56,37 @@ from mirgecom.eos import PyrometheusMixture
 import cantera
 import pyrometheus as pyro
 
+
+def write_snapshot(filename, data, comm):
+    """Write every rank's *data* to the shared HDF5 file *filename*.
+
+    *data* is pickled with protocol 5 so that large arrays stay out of band.
+    Each rank's pickle stream and out-of-band buffers are stored as ``uint8``
+    datasets in its own ``rank{rank:04d}`` group of a single file opened with
+    the MPI-IO driver. Collective over *comm*.
+    """
+    buffers = []
+    stream = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+    raws = [buf.raw() for buf in buffers]
+
+    # creating datasets is collective, so every rank needs every layout
+    layouts = comm.allgather((len(stream), [raw.nbytes for raw in raws]))
+    with h5py.File(filename, "w", driver="mpio", comm=comm) as h5:
+        for irank, (stream_nbytes, buffer_nbytes) in enumerate(layouts):
+            grp = h5.create_group(f"rank{irank:04d}")
+            grp.create_dataset("stream", (stream_nbytes,), dtype=np.uint8)
+            for i, nbytes in enumerate(buffer_nbytes):
+                grp.create_dataset(f"buffer{i}", (nbytes,), dtype=np.uint8)
+
+        grp = h5[f"rank{comm.Get_rank():04d}"]
+        grp["stream"][...] = np.frombuffer(stream, dtype=np.uint8)
+        for i, raw in enumerate(raws):
+            grp[f"buffer{i}"][...] = np.frombuffer(raw, dtype=np.uint8)
+
+
 @mpi_entry_point
 def run_init(ctx_factory=cl.create_some_context,
-         snapshot_pattern="flame1d-{step:06d}-{rank:04d}.pkl",
+         snapshot_pattern="flame1d-{step:06d}.h5",
          ):
     """Drive the Y0 example."""
 
@@ -198,15 +227,14 @@ def run_init(ctx_factory=cl.create_some_context,
 
     visualizer = make_visualizer(discr, order)
 
-    with open(snapshot_pattern.format(step=0, rank=rank), "wb") as f:
-        pickle.dump({
-            "local_mesh": local_mesh,
-            "state": obj_array_vectorize(actx.to_numpy, flatten(state)),
-            "t": 0.,
-            "step": 0,
-            "global_nelements": global_nelements,
-            "num_parts": nparts,
-            }, f)
+    write_snapshot(snapshot_pattern.format(step=0), {
+        "local_mesh": local_mesh,
+        "state": obj_array_vectorize(actx.to_numpy, flatten(state)),
+        "t": 0.,
+        "step": 0,
+        "global_nelements": global_nelements,
+        "num_parts": nparts,
+        }, comm)
 
     cv = split_conserved(dim, state)
     reaction_rates = eos.get_production_rates(cv)
@@ -29,6 +29,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 import yaml
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 import logging
 import numpy as np
 import pyopencl as cl
@@ -37,8 +41,10 @@ import pyopencl.array as cla  # noqa
 from functools import partial
 import math
 
-from pytools.obj_array import obj_array_vectorize
+from pytools.obj_array import make_obj_array
 import pickle
+import h5py
+from concurrent.futures import ThreadPoolExecutor
 
 from meshmode.array_context import PyOpenCLArrayContext
 from meshmode.dof_array import thaw, flatten, unflatten
@@ -89,10 +95,47 @@ from mirgecom.logging_quantities import (initialize_logmgr,
 logger = logging.getLogger(__name__)
 
 
+def write_snapshot(filename, data, comm):
+    """Write every rank's *data* to the shared HDF5 file *filename*.
+
+    *data* is pickled with protocol 5 so that large arrays stay out of band.
+    Each rank's pickle stream and out-of-band buffers are stored as ``uint8``
+    datasets in its own ``rank{rank:04d}`` group of a single file opened with
+    the MPI-IO driver. Collective over *comm*.
+    """
+    buffers = []
+    stream = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+    raws = [buf.raw() for buf in buffers]
+
+    # creating datasets is collective, so every rank needs every layout
+    layouts = comm.allgather((len(stream), [raw.nbytes for raw in raws]))
+    with h5py.File(filename, "w", driver="mpio", comm=comm) as h5:
+        for irank, (stream_nbytes, buffer_nbytes) in enumerate(layouts):
+            grp = h5.create_group(f"rank{irank:04d}")
+            grp.create_dataset("stream", (stream_nbytes,), dtype=np.uint8)
+            for i, nbytes in enumerate(buffer_nbytes):
+                grp.create_dataset(f"buffer{i}", (nbytes,), dtype=np.uint8)
+
+        grp = h5[f"rank{comm.Get_rank():04d}"]
+        grp["stream"][...] = np.frombuffer(stream, dtype=np.uint8)
+        for i, raw in enumerate(raws):
+            grp[f"buffer{i}"][...] = np.frombuffer(raw, dtype=np.uint8)
+
+
+def read_snapshot(filename, comm):
+    """Load this rank's data written by :func:`write_snapshot`."""
+    with h5py.File(filename, "r", driver="mpio", comm=comm) as h5:
+        grp = h5[f"rank{comm.Get_rank():04d}"]
+        stream = grp["stream"][...].tobytes()
+        buffers = [grp[f"buffer{i}"][...] for i in range(len(grp) - 1)]
+    return pickle.loads(stream, buffers=buffers)
+
+
 @mpi_entry_point
 def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input_file="",
-         snapshot_pattern="flame1d-{step:06d}-{rank:04d}.pkl",
-         restart_step=None, restart_name=None, use_logmgr=False):
+         snapshot_pattern="flame1d-{step:06d}.h5",
+         restart_step=None, restart_name=None, use_logmgr=False,
+         use_verbose_log=False):
     """Drive the 1D Flame example."""
 
     from mpi4py import MPI
@@ -122,23 +165,42 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
     #nrestart = 500
     nviz = 5
     nrestart = 5
+    integrator = "lsrk144"
     #current_dt = 5.0e-8 # stable with euler
-    current_dt = 5.0e-8 # stable with rk4
-    #current_dt = 4e-7 # stable with lrsrk144
-    t_final = 2.5e-7
+    #current_dt = 5.0e-8 # stable with rk4
+    current_dt = 4e-7 # stable with lrsrk144
+    t_final = 2.0e-6
 
-    #input_data = yaml.load_all(open('user_inputs.yaml', 'r'))
     if(user_input_file):
-        #input_data = yaml.load_all(open('{user_input_file}'.format(user_input_file=user_input_file), 'r'))
-        input_data = yaml.load_all(open(user_input_file), 'r')
-        #input_data = yaml.load_all(open('run2_params.yaml'), 'r')
-        with open('run2_params.yaml') as f:
-            input_data = yaml.load(f, Loader=yaml.FullLoader)
-            #print(input_data)
+        if rank == 0:
+            with open(user_input_file) as f:
+                input_data = yaml.load(f, Loader=YamlLoader)
+        else:
+            input_data = None
+        input_data = comm.bcast(input_data, root=0)
+
         nviz = int(input_data["nviz"])
         nrestart = int(input_data["nrestart"])
         current_dt = float(input_data["current_dt"])
         t_final = float(input_data["t_final"])
+        try:
+            integrator = input_data["integrator"]
+        except KeyError:
+            pass
+
+    # param sanity check
+    allowed_integrators = ["rk4", "euler", "lsrk54", "lsrk144"]
+    if integrator not in allowed_integrators:
+        error_message = "Invalid time integrator: {}".format(integrator)
+        raise RuntimeError(error_message)
+
+    timestepper = lsrk144_step
+    if integrator == "euler":
+        timestepper = euler_step
+    if integrator == "rk4":
+        timestepper = rk4_step
+    if integrator == "lsrk54":
+        timestepper = lsrk54_step
 
     if(rank == 0):
         print(f'Simluation control data:')
@@ -146,6 +208,7 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
         print(f'\tnrestart = {nrestart}')
         print(f'\tcurrent_dt = {current_dt}')
         print(f'\tt_final = {t_final}')
+        print(f'\tTime integration {integrator}')
 
     dim = 2
     order = 1
@@ -155,6 +218,8 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
     current_t = 0
     constant_cfl = False
     nstatus = 10000000000
+    nhealth = 20
+    nwarmup = 3
     checkpoint_t = current_t
     current_step = 0
     vel_burned = np.zeros(shape=(dim,))
@@ -162,67 +227,97 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
 
     # {{{  Set up initial state using Cantera
 
+    # Initial temperature, pressure, and mixutre mole fractions are needed to
+    # set up the initial state in Cantera.
+    temp_unburned = 300.0
+    temp_ignition = 1500.0
+
     # Use Cantera for initialization
     # -- Pick up a CTI for the thermochemistry config
     # --- Note: Users may add their own CTI file by dropping it into
     # ---       mirgecom/mechanisms alongside the other CTI files.
-    from mirgecom.mechanisms import get_mechanism_cti
-    # uiuc C2H4
-    #mech_cti = get_mechanism_cti("uiuc")
-    # sanDiego H2
-    mech_cti = get_mechanism_cti("sanDiego")
+    # Only rank 0 loads the mechanism and runs the Cantera equilibrium solve,
+    # everyone else gets the results (and the generated Pyrometheus code)
+    # by broadcast
+    if rank == 0:
+        from mirgecom.mechanisms import get_mechanism_cti
+        # uiuc C2H4
+        #mech_cti = get_mechanism_cti("uiuc")
+        # sanDiego H2
+        mech_cti = get_mechanism_cti("sanDiego")
+
+        cantera_soln = cantera.Solution(phase_id="gas", source=mech_cti)
+        nspecies = cantera_soln.n_species
+
+        # Parameters for calculating the amounts of fuel, oxidizer, and inert species
+        equiv_ratio = 1.0
+        ox_di_ratio = 0.21
+        # H2
+        stoich_ratio = 0.5
+        #C2H4
+        #stoich_ratio = 3.0
+        # Grab the array indices for the specific species, ethylene, oxygen, and nitrogen
+        # C2H4
+        #i_fu = cantera_soln.species_index("C2H4")
+        # H2
+        i_fu = cantera_soln.species_index("H2")
+        i_ox = cantera_soln.species_index("O2")
+        i_di = cantera_soln.species_index("N2")
+        # Set the species mole fractions according to our desired fuel/air mixture
+        x_fu = (ox_di_ratio*equiv_ratio)/(stoich_ratio+ox_di_ratio*equiv_ratio)
+        x_ox = stoich_ratio*x_fu/equiv_ratio
+        x_di = (1.0-ox_di_ratio)*x_ox/ox_di_ratio
+        x = np.zeros(nspecies)
+        x[[i_fu, i_ox, i_di]] = [x_fu, x_ox, x_di]
+        # Uncomment next line to make pylint fail when it can't find cantera.one_atm
+        one_atm = cantera.one_atm  # pylint: disable=no-member
+        # one_atm = 101325.0
+        pres_unburned = one_atm
+
+        # Let the user know about how Cantera is being initilized
+        logger.info(f"Input state (T,P,X) = ({temp_unburned}, {pres_unburned}, {x}")
+        # Set Cantera internal gas temperature, pressure, and mole fractios
+        cantera_soln.TPX = temp_unburned, pres_unburned, x
+        # Pull temperature, total density, mass fractions, and pressure from Cantera
+        # We need total density, and mass fractions to initialize the fluid/gas state.
+        can_t, rho_unburned, y_unburned = cantera_soln.TDY
+        can_p = cantera_soln.P
+        # *can_t*, *can_p* should not differ (significantly) from user's initial data,
+        # but we want to ensure that we use exactly the same starting point as Cantera,
+        # so we use Cantera's version of these data.
+
+
+        # now find the conditions for the burned gas
+        cantera_soln.equilibrate('TP')
+        temp_burned, rho_burned, y_burned = cantera_soln.TDY
+        pres_burned = cantera_soln.P
+
+        init_data = {
+            "nspecies": nspecies,
+            "pres_unburned": pres_unburned,
+            "rho_unburned": rho_unburned,
+            "y_unburned": y_unburned,
+            "temp_burned": temp_burned,
+            "pres_burned": pres_burned,
+            "rho_burned": rho_burned,
+            "y_burned": y_burned,
+            "thermochem_code": pyro.gen_thermochem_code(cantera_soln),
+            }
+    else:
+        init_data = None
+    init_data = comm.bcast(init_data, root=0)
 
-    cantera_soln = cantera.Solution(phase_id="gas", source=mech_cti)
-    nspecies = cantera_soln.n_species
+    nspecies = init_data["nspecies"]
+    pres_unburned = init_data["pres_unburned"]
+    rho_unburned = init_data["rho_unburned"]
+    y_unburned = init_data["y_unburned"]
+    temp_burned = init_data["temp_burned"]
+    pres_burned = init_data["pres_burned"]
+    rho_burned = init_data["rho_burned"]
+    y_burned = init_data["y_burned"]
 
-    # Initial temperature, pressure, and mixutre mole fractions are needed to
-    # set up the initial state in Cantera.
-    temp_unburned = 300.0
-    temp_ignition = 1500.0
-    # Parameters for calculating the amounts of fuel, oxidizer, and inert species
-    equiv_ratio = 1.0
-    ox_di_ratio = 0.21
-    # H2
-    stoich_ratio = 0.5
-    #C2H4
-    #stoich_ratio = 3.0
-    # Grab the array indices for the specific species, ethylene, oxygen, and nitrogen
-    # C2H4
-    #i_fu = cantera_soln.species_index("C2H4")
-    # H2
-    i_fu = cantera_soln.species_index("H2")
-    i_ox = cantera_soln.species_index("O2")
-    i_di = cantera_soln.species_index("N2")
-    x = np.zeros(nspecies)
-    # Set the species mole fractions according to our desired fuel/air mixture
-    x[i_fu] = (ox_di_ratio*equiv_ratio)/(stoich_ratio+ox_di_ratio*equiv_ratio)
-    x[i_ox] = stoich_ratio*x[i_fu]/equiv_ratio
-    x[i_di] = (1.0-ox_di_ratio)*x[i_ox]/ox_di_ratio
-    # Uncomment next line to make pylint fail when it can't find cantera.one_atm
-    one_atm = cantera.one_atm  # pylint: disable=no-member
-    # one_atm = 101325.0
-    pres_unburned = one_atm
-
-    # Let the user know about how Cantera is being initilized
-    print(f"Input state (T,P,X) = ({temp_unburned}, {pres_unburned}, {x}")
-    # Set Cantera internal gas temperature, pressure, and mole fractios
-    cantera_soln.TPX = temp_unburned, pres_unburned, x
-    # Pull temperature, total density, mass fractions, and pressure from Cantera
-    # We need total density, and mass fractions to initialize the fluid/gas state.
-    y_unburned = np.zeros(nspecies)
-    can_t, rho_unburned, y_unburned = cantera_soln.TDY
-    can_p = cantera_soln.P
-    # *can_t*, *can_p* should not differ (significantly) from user's initial data,
-    # but we want to ensure that we use exactly the same starting point as Cantera,
-    # so we use Cantera's version of these data.
-
-
-    # now find the conditions for the burned gas
-    cantera_soln.equilibrate('TP')
-    temp_burned, rho_burned, y_burned = cantera_soln.TDY
-    pres_burned = cantera_soln.P
-
-    pyrometheus_mechanism = pyro.get_thermochem_class(cantera_soln)(actx.np)
+    pyrometheus_mechanism = pyro.compile_class(
+        init_data["thermochem_code"])(actx.np)
 
     # C2H4
     mu = 1.e-5
@@ -237,9 +332,10 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
     eos = PyrometheusMixture(pyrometheus_mechanism, temperature_guess=temp_unburned, transport_model=transport_model)
     species_names = pyrometheus_mechanism.species_names
 
-    print(f"Pyrometheus mechanism species names {species_names}")
-    print(f"Unburned state (T,P,Y) = ({temp_unburned}, {pres_unburned}, {y_unburned}")
-    print(f"Burned state (T,P,Y) = ({temp_burned}, {pres_burned}, {y_burned}")
+    if rank == 0:
+        logger.info(f"Pyrometheus mechanism species names {species_names}")
+        logger.info(f"Unburned state (T,P,Y) = ({temp_unburned}, {pres_unburned}, {y_unburned}")
+        logger.info(f"Burned state (T,P,Y) = ({temp_burned}, {pres_burned}, {y_burned}")
 
     flame_start_loc = 0.05
     flame_speed = 1000
@@ -267,15 +363,49 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
                   sym.DTAG_BOUNDARY("Outflow"): outflow,
                   sym.DTAG_BOUNDARY("Wall"): wall}
 
+    def state_to_numpy(state):
+        # copy each conserved component straight into its slice of the
+        # pinned host buffer and wait once, the returned arrays are views
+        for i, ary in enumerate(flatten(state)):
+            cl.enqueue_copy(queue,
+                            host_state[state_offsets[i]:state_offsets[i+1]],
+                            ary.base_data, device_offset=ary.offset,
+                            is_blocking=False)
+        queue.finish()
+        return np.split(host_state, state_offsets[1:-1])
+
+    def state_from_numpy(state_arrays):
+        # inverse of state_to_numpy: stage through the pinned host buffer,
+        # one host->device copy, then views into it for each component
+        np.concatenate(state_arrays, out=host_state)
+        dev_state = cla.empty(queue, host_state.shape, host_state.dtype,
+                              allocator=actx.allocator)
+        dev_state.set(host_state, queue=queue)
+        return unflatten(actx, discr.discr_from_dd("vol"),
+            make_obj_array([dev_state[state_offsets[i]:state_offsets[i+1]]
+                            for i in range(len(state_offsets) - 1)]))
+
     # process restart
-    with open(snapshot_pattern.format(casename=restart_name, step=restart_step, rank=rank), "rb") as f:
-        restart_data = pickle.load(f)
+    restart_data = read_snapshot(snapshot_pattern.format(
+        casename=restart_name, step=restart_step), comm)
     local_mesh = restart_data["local_mesh"]
     local_nelements = local_mesh.nelements
     global_nelements = restart_data["global_nelements"]
 
     assert comm.Get_size() == restart_data["num_parts"]
 
+    # page-locked host buffer for the whole flattened state, allocated once
+    # and reused for the restart read and every restart write
+    state_sizes = [ary.size for ary in restart_data["state"]]
+    state_offsets = np.concatenate([[0], np.cumsum(state_sizes)])
+    state_dtype = restart_data["state"][0].dtype
+    pinned_buf = cl.Buffer(cl_ctx,
+        cl.mem_flags.READ_WRITE | cl.mem_flags.ALLOC_HOST_PTR,
+        size=int(state_offsets[-1])*state_dtype.itemsize)
+    host_state, _ = cl.enqueue_map_buffer(queue, pinned_buf,
+        cl.map_flags.READ | cl.map_flags.WRITE, 0,
+        (int(state_offsets[-1]),), state_dtype)
+
     if rank == 0:
         logging.info("Making discretization")
     discr = EagerDGDiscretization(
@@ -286,20 +416,22 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
     current_t = restart_data["t"]
     current_step = restart_step
 
-    current_state = unflatten(
-        actx, discr.discr_from_dd("vol"),
-        obj_array_vectorize(actx.from_numpy, restart_data["state"]))
+    current_state = state_from_numpy(restart_data["state"])
 
     vis_timer = None
 
     if logmgr:
         logmgr_add_cl_device_info(logmgr, queue)
-        logmgr_add_many_discretization_quantities(logmgr, discr, dim,
-            extract_vars_for_logging, units_for_logging)
         logmgr_set_time(logmgr, current_step, current_t)
-        logmgr.add_watches(["step.max", "t_sim.max", "t_step.max", "t_log.max",
-                            "min_pressure", "max_pressure",
-                            "min_temperature", "max_temperature"])
+        logmgr.add_watches(["step.max", "t_sim.max", "t_step.max", "t_log.max"])
+
+        # the pressure/temperature quantities each need a pass over the
+        # state (temperature a Newton solve) every step, only add on request
+        if use_verbose_log:
+            logmgr_add_many_discretization_quantities(logmgr, discr, dim,
+                extract_vars_for_logging, units_for_logging)
+            logmgr.add_watches(["min_pressure", "max_pressure",
+                                "min_temperature", "max_temperature"])
 
         try:
             logmgr.add_watches(["memory_usage_python.max",
@@ -311,49 +443,107 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
         logmgr.add_quantity(vis_timer)
 
     visualizer = make_visualizer(discr, order)
-    timestepper = euler_step
 
-    get_timestep = partial(inviscid_sim_timestep, discr=discr, t=current_t,
-                           dt=current_dt, cfl=current_cfl, eos=eos,
-                           t_final=t_final, constant_cfl=constant_cfl)
+    if constant_cfl:
+        get_timestep = partial(inviscid_sim_timestep, discr=discr, t=current_t,
+                               dt=current_dt, cfl=current_cfl, eos=eos,
+                               t_final=t_final, constant_cfl=constant_cfl)
+    else:
+        # fixed dt, no need to look at the state
+        def get_timestep(state):
+            return current_dt
 
     
+    # compile the full RHS as one function so the source term add can be
+    # fused with the operator rather than done as a separate pass
+    def get_rhs(t, state):
+        cv = split_conserved(dim=dim, q=state)
+        return (ns_operator(discr, q=state, t=t, boundaries=boundaries, eos=eos)
+                + eos.get_species_source_terms(cv))
+
+    compute_rhs = actx.compile(get_rhs)
+
     def my_rhs(t, state):
-        # check for some troublesome output types
-        inf_exists = not np.isfinite(discr.norm(state, np.inf))
-        if inf_exists:
-            if rank == 0:
-                logging.info("Non-finite values detected in simulation, exiting...")
-            # dump right now
-            sim_checkpoint(discr=discr, visualizer=visualizer, eos=eos,
-                              q=state, vizname=casename,
-                              step=999999999, t=t, dt=current_dt,
-                              nviz=1, exittol=exittol,
-                              constant_cfl=constant_cfl, comm=comm, vis_timer=vis_timer,
-                              overwrite=True,s0=s0_sc,kappa=kappa_sc)
-            exit()
+        return compute_rhs(t, state)
 
-        cv = split_conserved(dim=dim, q=state)
-        return ( ns_operator(discr, q=state, t=t, boundaries=boundaries, eos=eos)
-                 + eos.get_species_source_terms(cv))
+    def get_production_rates(state):
+        cv = split_conserved(dim, state)
+        return eos.get_production_rates(cv)
+
+    compute_production_rates = actx.compile(get_production_rates)
+
+    # flags whether any entry of an array is inf/nan, a plain OR-reduction
+    # rather than the abs + max needed for an inf-norm
+    from pyopencl.reduction import ReductionKernel
+    nonfinite_knl = ReductionKernel(cl_ctx, np.int8, neutral="0",
+                                    reduce_expr="a|b",
+                                    map_expr="!isfinite(x[i])",
+                                    arguments="__global const double *x")
+
+    def state_has_nonfinite(state):
+        local_nonfinite = any(nonfinite_knl(ary, queue=queue).get()
+                              for ary in flatten(state))
+        return comm.allreduce(local_nonfinite, op=MPI.LOR)
+
+    # restart files are written from a background thread so the disk I/O
+    # overlaps with the following steps, with at most one write in flight.
+    # The write is collective, so it gets its own communicator and can only
+    # run off the main thread if MPI allows concurrent calls from threads.
+    io_pool = ThreadPoolExecutor(max_workers=1)
+    io_comm = comm.Dup()
+    async_restart = MPI.Query_thread() == MPI.THREAD_MULTIPLE
+    pending_write = None
+
+    def wait_for_restart_write():
+        nonlocal pending_write
+        if pending_write is not None:
+            pending_write.result()
+            pending_write = None
 
     def my_checkpoint(step, t, dt, state):
+        nonlocal pending_write
+
+        # check for some troublesome output types, once per step
+        # rather than once per RHS evaluation
+        if check_step(step, nhealth):
+            inf_exists = state_has_nonfinite(state)
+            if inf_exists:
+                if rank == 0:
+                    logging.info("Non-finite values detected in simulation, exiting...")
+                # dump right now
+                sim_checkpoint(discr=discr, visualizer=visualizer, eos=eos,
+                                  q=state, vizname=casename,
+                                  step=999999999, t=t, dt=dt,
+                                  nviz=1, exittol=exittol,
+                                  constant_cfl=constant_cfl, comm=comm, vis_timer=vis_timer,
+                                  overwrite=True)
+                wait_for_restart_write()
+                exit()
 
         write_restart = (check_step(step, nrestart)
                          if step != restart_step else False)
         if write_restart is True:
-            with open(snapshot_pattern.format(casename=casename, step=step, rank=rank), "wb") as f:
-                pickle.dump({
-                    "local_mesh": local_mesh,
-                    "state": obj_array_vectorize(actx.to_numpy, flatten(state)),
-                    "t": t,
-                    "step": step,
-                    "global_nelements": global_nelements,
-                    "num_parts": nparts,
-                    }, f)
-
-        cv = split_conserved(dim, state)
-        reaction_rates = eos.get_production_rates(cv)
+            # the previous write still reads from the pinned host buffer,
+            # so let it finish before copying the new state into it
+            wait_for_restart_write()
+            # the device->host copy happens here, only the serialization
+            # and file write may be handed off
+            restart_data = {
+                "local_mesh": local_mesh,
+                "state": state_to_numpy(state),
+                "t": t,
+                "step": step,
+                "global_nelements": global_nelements,
+                "num_parts": nparts,
+                }
+            restart_file = snapshot_pattern.format(casename=casename, step=step)
+            if async_restart:
+                pending_write = io_pool.submit(write_snapshot, restart_file,
+                                               restart_data, io_comm)
+            else:
+                write_snapshot(restart_file, restart_data, io_comm)
+
+        reaction_rates = compute_production_rates(state)
         viz_fields = [("reaction_rates", reaction_rates)]
         
         return sim_checkpoint(discr=discr, visualizer=visualizer, eos=eos,
@@ -363,6 +553,19 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
                               constant_cfl=constant_cfl, comm=comm, vis_timer=vis_timer,
                               overwrite=True, viz_fields=viz_fields)
 
+    # evaluate the RHS a few times before stepping so the memory pool is
+    # populated (and any kernels are built) before the timed steps start,
+    # the checkpoint's reaction rates and health check get built here too
+    if rank == 0:
+        logging.info("Warming up.")
+    for _ in range(nwarmup):
+        my_rhs(current_t, current_state)
+    compute_production_rates(current_state)
+    state_has_nonfinite(current_state)
+    queue.finish()
+    if logmgr:
+        logmgr_set_time(logmgr, current_step, current_t)
+
     if rank == 0:
         logging.info("Stepping.")
 
@@ -379,6 +582,9 @@ def run_flame(ctx_factory=cl.create_some_context, casename="flame1d", user_input
     my_checkpoint(current_step, t=current_t,
                   dt=(current_t - checkpoint_t),
                   state=current_state)
+    wait_for_restart_write()
+    io_pool.shutdown()
+    io_comm.Free()
 
     if current_t - t_final < 0:
         raise ValueError("Simulation exited abnormally")
@@ -410,6 +616,9 @@ if __name__ == "__main__":
                         help='simulation case name')
     parser.add_argument("--log", action="store_true", default=True,
         help="enable logging profiling [ON]")
+    parser.add_argument("--verbose-log", action="store_true", default=False,
+        dest="verbose_log",
+        help="log pressure and temperature ranges every step [OFF]")
 
     args = parser.parse_args()
 
@@ -421,19 +630,21 @@ if __name__ == "__main__":
     else:
         print(f"Default casename {casename}")
 
-    snapshot_pattern="{casename}-{step:06d}-{rank:04d}.pkl"
+    snapshot_pattern="{casename}-{step:06d}.h5"
     restart_step=None
     restart_name=None
     if(args.restart_file):
         print(f"Restarting from file {args.restart_file}")
-        file_path, file_name = os.path.split(args.restart_file)
-        restart_step = int(file_name.split('-')[1])
-        restart_name = (file_name.split('-')[0]).replace("'","")
+        file_path, file_name = os.path.split((args.restart_file).replace("'",""))
+        file_base, file_ext = os.path.splitext(file_name)
+        restart_step = int(file_base.split('-')[1])
+        restart_name = file_base.split('-')[0]
         print(f"step {restart_step}")
         print(f"name {restart_name}")
     #print(f"step {restart_step}")
 
 
+    input_file = ""
     if(args.input_file):
         input_file = (args.input_file).replace("'","")
         print(f"Reading user input from {args.input_file}")
@@ -443,7 +654,8 @@ if __name__ == "__main__":
 
     print(f"Running {sys.argv[0]}\n")
     run_flame(restart_step=restart_step, restart_name=restart_name, user_input_file=input_file,
-         snapshot_pattern=snapshot_pattern, use_logmgr=args.log, casename=casename)
+         snapshot_pattern=snapshot_pattern, use_logmgr=args.log,
+         use_verbose_log=args.verbose_log, casename=casename)
 
 
 # vim: foldmethod=marker
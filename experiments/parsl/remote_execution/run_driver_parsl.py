@@ -104,7 +104,7 @@ def run_mirge_sim(execution_string='', stdout='run.stdout', stderr='run.stderr',
     return(execution_string)
 
 # first run is just an init, locally
-init_restart_file = File(os.path.join(os.getcwd(), 'flame1d-000000-0000.pkl'))
+init_restart_file = File(os.path.join(os.getcwd(), 'flame1d-000000.h5'))
 intro_str = 'echo "Running flame1d_init"\n'
 conda_str = load_conda()
 execution_str = 'python -u -m mpi4py flame_init.py\n'
@@ -119,7 +119,7 @@ print('Result: {}'.format(flame_init.result()))
 print('Done: {}'.format(flame_init.done()))
 
 # second run is a restart from the init, on lassen
-run_restart_file = File(os.path.join(os.getcwd(), 'flame1d_run-000005-0000.pkl'))
+run_restart_file = File(os.path.join(os.getcwd(), 'flame1d_run-000005.h5'))
 run_viz_file = File(os.path.join(os.getcwd(), 'flame1d_run-000005.pvtu'))
 input_file = File(os.path.join(os.getcwd(), 'run1_params.yaml'))
 casename='flame1d_run'